@@ -7,6 +7,7 @@
 
 """
 
+import json
 import warnings
 from collections import namedtuple
 import re
@@ -28,6 +29,17 @@ Comment = namedtuple('Comment', ('data'))
 # Splits <whitespace><anything><whitespace> apart.
 TEXT_MATCH = re.compile(r'(\s*)(\S?.*\S)(\s*)')
 
+# For the quick pre-scan: leading whitespace / comments, then the doctype.
+# (comments can't run on past their first -->, so this never backtracks far.)
+DOCTYPE_MATCH = re.compile(r'\ufeff?(?:\s|<!--(?:[^-]|-(?!->))*-->)*<!doctype\s+html[\s>]', re.I)
+# Start of a comment, CDATA, doctype / processing instruction, or tag name.
+TAG_START = re.compile(r'<(?:(!--)|(!\[CDATA\[)|[!?]|(/?)([a-zA-Z][^\s/>]*))')
+# The rest of a tag, after its name.
+TAG_REST = re.compile(r'((?:"[^"]*"|\'[^\']*\'|[^\'">])*)>')
+# attribute names (and values, which we skip) inside a tag.
+ATTR_SCAN = re.compile(
+    r'([^\s"\'>/=]+)(?:\s*=\s*(?:"[^"]*"|\'[^\']*\'|[^\s"\'>]*))?')
+
 from html5lib.html5parser import ParseError
 
 class HTML5Invalid(Exception):
@@ -60,6 +72,9 @@ class NonSecureRequestInSecurePage(ValidationException):
 class UnclosedTags(ValidationException):
     pass
 
+class FramingError(ValueError):
+    pass
+
 # 8. Namespaces:
 
 namespaces = {
@@ -194,6 +209,12 @@ html_elements = {
     "track": ('video', 'audio'),
 }
 
+# 13.1.2 - contents of these are not parsed as tags.
+raw_text_elements = frozenset(('script', 'style', 'textarea', 'title', 'xmp', 'iframe', 'noembed', 'noframes'))
+
+# 13.2.6.5 - SVG & MathML, which don't follow the HTML element rules.
+foreign_elements = frozenset(('svg', 'math'))
+
 non_recursable = frozenset(('html', 'head', 'body','video','audio', 'noscript', 'form'))
 
 # 12.1.2
@@ -431,35 +452,78 @@ class Validator:
     """
         Drills through a html5lib HTML tree, and checks all the elements
         against various rules.
+
+        Only the events (methods) which some enabled rule asks for in
+        rule_events get called.  Subclasses overriding text(), comment(),
+        doctype() etc. need to add a rule asking for that event, or they
+        will never be called:
+
+            class MyValidator(Validator):
+                rule_events = dict(Validator.rule_events, words=frozenset(('text',)))
     """
-    def __init__(self, tree):
+
+    # Which events each rule needs: 'startTag', 'endTag', 'voidTag', 'text',
+    # 'comment' & 'doctype' are the methods of the same names, and
+    # 'attributes' passes elements' attributes to startTag() & voidTag()
+    # (otherwise they get none).  The built-in checks themselves only run
+    # when their own rule is enabled.
+    rule_events = {
+        'structure': frozenset(('startTag', 'endTag', 'voidTag')),
+        'attributes': frozenset(('startTag', 'voidTag', 'attributes')),
+    }
+
+    def __init__(self, tree, rules=None):
         self.tree = tree
         self._in_doctype = False
         self._inside = [] # a stack of 
 
+        if rules is None:
+            rules = self.rule_events.keys()
+        elif isinstance(rules, str):
+            raise TypeError(f"rules should be a collection of rule names, not {rules!r}")
+        try:
+            self.events = frozenset().union(*(self.rule_events[r] for r in rules))
+        except KeyError as e:
+            raise ValueError(f"Unknown rule: {e.args[0]}")
+        self.rules = frozenset(rules)
+
     def __call__(self):
         """
             Actually validate the tree.
         """
 
+        # the dispatch plan - which events any enabled rule cares about:
+        do_doctype = 'doctype' in self.events
+        do_text = 'text' in self.events
+        do_comment = 'comment' in self.events
+        do_start = 'startTag' in self.events
+        do_end = 'endTag' in self.events
+        do_void = 'voidTag' in self.events
+        do_attributes = 'attributes' in self.events
+
         currentNode = self.tree
         while currentNode is not None:
 
             if currentNode.nodeType == Node.DOCUMENT_TYPE_NODE:
-                self.doctype(currentNode.name, currentNode.publicId, currentNode.systemId)
+                if do_doctype:
+                    self.doctype(currentNode.name, currentNode.publicId, currentNode.systemId)
 
             elif currentNode.nodeType in (Node.TEXT_NODE, Node.CDATA_SECTION_NODE):
-                self.text(currentNode.nodeValue)
+                if do_text:
+                    self.text(currentNode.nodeValue)
 
             elif currentNode.nodeType == Node.ELEMENT_NODE:
                 if hasattr(currentNode, 'tagName'):
+                    attributes = currentNode.attributes if do_attributes else {}
                     if currentNode.tagName in void_elements:
-                        self.voidTag(currentNode.tagName, currentNode.attributes)
-                    else:
-                        self.startTag(currentNode.tagName, currentNode.attributes)
+                        if do_void:
+                            self.voidTag(currentNode.tagName, attributes)
+                    elif do_start:
+                        self.startTag(currentNode.tagName, attributes)
 
             elif currentNode.nodeType == Node.COMMENT_NODE:
-                self.comment(currentNode)
+                if do_comment:
+                    self.comment(currentNode)
 
             elif currentNode.nodeType in (Node.DOCUMENT_NODE, Node.DOCUMENT_FRAGMENT_NODE):
                 self.document_node(currentNode)
@@ -476,7 +540,8 @@ class Validator:
             elif currentNode.nextSibling:
                 currentNode = currentNode.nextSibling
             else:
-                self.endTag(currentNode.parentNode.tagName)
+                if do_end:
+                    self.endTag(currentNode.parentNode.tagName)
                 currentNode = currentNode.parentNode.nextSibling or None
 
             if currentNode == self.tree:
@@ -526,11 +591,16 @@ class Validator:
 
         if name in void_elements:
             raise InvalidTag(f"{name} cannot be used as a Start Tag")
-        if name in non_recursable and name in self._inside:
-            raise MisplacedElement(f"{name} cannot be inside {name}")
 
-        self.check_valid_place(name)
-        self.check_valid_attrs(name, attributes)
+        if 'structure' in self.rules:
+            if name in non_recursable and name in self._inside:
+                raise MisplacedElement(f"{name} cannot be inside {name}")
+            self.check_valid_place(name)
+        elif self._inside == ['html', 'head'] and name == 'body':
+            self._inside.pop()
+
+        if 'attributes' in self.rules:
+            self.check_valid_attrs(name, attributes)
         self._inside.append(name)
 
         return StartTag(name, attributes)
@@ -544,14 +614,19 @@ class Validator:
         else:
             if self._inside == ['html', 'body'] and name == 'html':
                 return
+            if 'structure' not in self.rules:
+                return
             raise MisplacedElement(f"End tag for {name} when not inside.")
 
-        self.check_valid_place(name)
+        if 'structure' in self.rules:
+            self.check_valid_place(name)
         return EndTag(name)
 
     def voidTag(self, name, attrs, hasChildren=False):
-        self.check_valid_place(name)
-        self.check_valid_attrs(name, attrs)
+        if 'structure' in self.rules:
+            self.check_valid_place(name)
+        if 'attributes' in self.rules:
+            self.check_valid_attrs(name, attrs)
 
         return VoidTag(name, attrs, hasChildren)
 
@@ -580,26 +655,221 @@ class Validator:
         raise Exception(f'Unknown! {nodeType}')
 
 
+def prescan(text):
+    """
+        Quick linear scan over the raw text, checking tag & attribute names
+        against the tables above without building a tree.  Only raises for
+        things the full validation would reject anyway, so anything passing
+        here still needs a proper validate().
+    """
+    if not text.strip():
+        raise EmptyPage()
+
+    if not DOCTYPE_MATCH.match(text):
+        raise ParseError("Expected <!doctype html> at start of document.")
+
+    # Anything left unterminated (a comment, a tag with no '>', ...) stops
+    # the scan, and is left for the full parse, so each part of the text is
+    # only ever looked at once or twice.
+    pos = 0
+    while True:
+        match = TAG_START.search(text, pos)
+        if match is None:
+            return
+        comment, cdata, closing, name = match.groups()
+
+        if name is None:
+            end = text.find('-->' if comment else ']]>' if cdata else '>', match.end())
+            if end == -1:
+                return
+            pos = end + 1
+            continue
+
+        rest = TAG_REST.match(text, match.end())
+        if rest is None:
+            return
+        pos = rest.end()
+        attrs = rest.group(1)
+        name = name.lower()
 
+        if name in foreign_elements:
+            if closing or attrs.endswith('/'):
+                continue
+            # skip to the matching end tag, foreign content has its own rules.
+            depth = 1
+            for end in re.compile(f'<(/?){name}[\\s/>]', re.I).finditer(text, pos):
+                depth += -1 if end.group(1) else 1
+                if depth == 0:
+                    pos = end.start()
+                    break
+            else:
+                return
+            continue
+
+        if name not in html_elements:
+            raise InvalidTag(f"{name} is not a valid HTML5 tag.")
+
+        if closing:
+            continue
 
-def validate(text):
+        for attr in ATTR_SCAN.finditer(attrs):
+            k = attr.group(1).lower()
+            if k in global_attributes:
+                continue
+            if k in element_attributes.get(name, ()):
+                continue
+            if k.startswith('data-'):
+                continue
+            if k in element_attribute_warnings.get(name, ()):
+                continue
+            raise InvalidAttribute(f' {k} is not a valid attribute for {name}')
+
+        if name in raw_text_elements:
+            end = re.compile(f'</{name}[\\s/>]', re.I).search(text, pos)
+            if end is None:
+                return
+            pos = end.start()
+
+
+def validate(text, quick=False, rules=None):
     """
         If text is valid HTML5, return None.
         Otherwise, raise some kind of Parsing or Linting Exception.
+
+        With quick=True, run prescan() first, so grossly broken pages fail
+        without the cost of the full parse.
+
+        rules limits which of Validator.rule_events are checked (default: all).
     """
     if not text.strip():
         raise EmptyPage()
 
+    if quick:
+        prescan(text)
+
     dom = PARSER.parse(text)
 
-    validator = Validator(dom)
+    validator = Validator(dom, rules)
     validator()
 
+STREAM_CHUNK_SIZE = 64 * 1024
+
+def read_stream(fh, framing='jsonl'):
+    """
+        Split a binary stream of many documents apart, yielding (id, text)
+        pairs one at a time, so only one document is held in memory.
+
+        framing is one of:
+            'jsonl'  - one JSON value per line, either a string, or an object
+                       with "html" (and optionally "id") keys.
+            'nul'    - documents separated by NUL bytes.
+            'length' - each document preceded by its length in bytes, in
+                       decimal, on a line of its own.
+
+        A malformed jsonl line yields a FramingError in place of the text, so
+        the rest of the stream can carry on.  Broken length framing can't be
+        recovered from, so raises FramingError.
+    """
+    if framing == 'jsonl':
+        for index, line in enumerate(fh):
+            if not line.strip():
+                continue
+            try:
+                doc = json.loads(line)
+            except ValueError as e:
+                yield index, FramingError(f"Line {index} is not valid JSON: {e}")
+                continue
+            if isinstance(doc, dict):
+                if not isinstance(doc.get('html'), str):
+                    yield doc.get('id', index), FramingError(f'Line {index} has no "html" string.')
+                else:
+                    yield doc.get('id', index), doc['html']
+            elif isinstance(doc, str):
+                yield index, doc
+            else:
+                yield index, FramingError(f"Line {index} is not a string or object.")
+
+    elif framing == 'nul':
+        index = 0
+        pieces = [] # of the current document, only joined once it's complete.
+        while True:
+            chunk = fh.read(STREAM_CHUNK_SIZE)
+            if not chunk:
+                break
+            *ends, rest = chunk.split(b'\0')
+            for end in ends:
+                pieces.append(end)
+                yield index, b''.join(pieces).decode('utf-8', 'replace')
+                index += 1
+                pieces = []
+            pieces.append(rest)
+        if any(pieces):
+            yield index, b''.join(pieces).decode('utf-8', 'replace')
+
+    elif framing == 'length':
+        index = 0
+        while True:
+            header = fh.readline()
+            if not header:
+                break
+            if not header.strip():
+                continue
+            digits = header.rstrip(b'\r\n')
+            if not digits.isdigit():
+                raise FramingError(f"Document {index} has a bad length header: {header[:80]!r}")
+            length = int(digits)
+            doc = fh.read(length)
+            if len(doc) < length:
+                raise FramingError(f"Document {index} truncated: expected {length} bytes, got {len(doc)}")
+            yield index, doc.decode('utf-8', 'replace')
+            index += 1
+
+    else:
+        raise ValueError(f"Unknown framing: {framing}")
+
+def validate_stream(infile, outfile, framing='jsonl', quick=False):
+    """
+        Validate every document in infile (see read_stream), writing one
+        JSON result line per document to outfile as soon as it's done.
+        Returns the number of invalid documents.
+    """
+    failures = 0
+    for doc_id, text in read_stream(infile, framing):
+        result = {'id': doc_id, 'valid': True}
+        try:
+            if isinstance(text, FramingError):
+                raise text
+            validate(text, quick=quick)
+        except Exception as e:
+            failures += 1
+            result.update(valid=False, error=type(e).__name__, message=str(e))
+        outfile.write(json.dumps(result) + '\n')
+        outfile.flush()
+    return failures
+
 if __name__ == '__main__':
+    import argparse
     import sys
-    if len(sys.argv) > 1:
-        for f in sys.argv[1:]:
+
+    parser = argparse.ArgumentParser(description='Validate HTML5 documents.')
+    parser.add_argument('files', nargs='*', help='files to validate (default: stdin)')
+    parser.add_argument('--quick', action='store_true',
+                        help='run the cheap pre-scan before the full parse')
+    parser.add_argument('--stream', choices=('jsonl', 'nul', 'length'),
+                        help='read many framed documents from stdin, writing a JSON result line for each')
+    args = parser.parse_args()
+
+    if args.stream:
+        if args.files:
+            parser.error('--stream reads from stdin, and cannot be given files')
+        try:
+            failures = validate_stream(sys.stdin.buffer, sys.stdout, args.stream, args.quick)
+        except FramingError as e:
+            sys.exit(f'html5validate: {e}')
+        sys.exit(1 if failures else 0)
+    elif args.files:
+        for f in args.files:
             with open(f) as fh:
-                validate(fh.read())
+                validate(fh.read(), quick=args.quick)
     else:
-        validate(sys.stdin.read())
+        validate(sys.stdin.read(), quick=args.quick)
@@ -0,0 +1,153 @@
+"""
+    pytest_html5validate
+    ------
+    pytest plugin for html5validate.  Gives tests an `html5validate` fixture,
+    backed by one validation engine per session, which caches results by
+    content hash on disk (in the pytest cache dir, so pytest-xdist workers
+    share it), and reports the slowest documents at the end.
+    MIT Licence - (C) 2019 Daniel Fairhead
+
+"""
+
+import builtins
+import hashlib
+import json
+import os
+import tempfile
+import time
+import warnings
+
+import html5lib
+import pytest
+
+import html5validate
+
+# Changes whenever the validator or its tables do, so cached results from an
+# older html5validate are never reused.
+with open(html5validate.__file__, 'rb') as fh:
+    LIBRARY_HASH = hashlib.sha256(fh.read()).hexdigest()
+
+class ValidationEngine:
+    """
+        Validates documents, remembering the result (and any warnings) for
+        each distinct (text, options) in cache_dir, if given, so identical
+        pages are only ever parsed once.  cache_dir may also be a function
+        returning the directory, only called once it's actually needed.
+    """
+    def __init__(self, cache_dir=None):
+        self._cache_dir = cache_dir
+        self.timings = [] # (seconds, name) of each document actually parsed.
+        self.hits = 0
+
+    @property
+    def cache_dir(self):
+        if callable(self._cache_dir):
+            self._cache_dir = self._cache_dir()
+        return self._cache_dir
+
+    def key(self, text, quick, rules):
+        options = json.dumps([LIBRARY_HASH, html5lib.__version__, quick,
+                              sorted(rules) if rules is not None else None])
+        return hashlib.sha256(f'{options}\n{text}'.encode('utf-8', 'surrogatepass')).hexdigest()
+
+    def _load(self, key):
+        try:
+            with open(os.path.join(self.cache_dir, key)) as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return None
+
+    def _store(self, key, result):
+        # write then rename, so other workers never see half a file.
+        fd, tmpname = tempfile.mkstemp(dir=self.cache_dir)
+        with os.fdopen(fd, 'w') as fh:
+            json.dump(result, fh)
+        os.replace(tmpname, os.path.join(self.cache_dir, key))
+
+    def __call__(self, text, quick=False, rules=None, name=None):
+        """
+            Same as html5validate.validate(), but cached.  name is only used
+            for reporting the slowest documents.
+        """
+        key = self.key(text, quick, rules)
+        result = self._load(key) if self.cache_dir else None
+
+        if result is not None:
+            self.hits += 1
+        else:
+            result = {'valid': True}
+            start = time.perf_counter()
+            try:
+                with warnings.catch_warnings(record=True) as caught:
+                    warnings.simplefilter('always')
+                    html5validate.validate(text, quick=quick, rules=rules)
+            except (html5validate.HTML5Invalid, html5validate.ParseError) as e:
+                result = {'valid': False, 'error': type(e).__name__, 'message': str(e)}
+            finally:
+                self.timings.append((time.perf_counter() - start, name or key[:12]))
+            result['warnings'] = [(w.category.__name__, str(w.message)) for w in caught]
+            if self.cache_dir:
+                self._store(key, result)
+
+        # re-emitted here, so cached and fresh results warn the same way.
+        for category, message in result.get('warnings', ()):
+            warnings.warn(message, getattr(builtins, category, UserWarning), stacklevel=2)
+
+        if not result['valid']:
+            exception = getattr(html5validate, result['error'], html5validate.HTML5Invalid)
+            raise exception(result['message'])
+
+engine_key = pytest.StashKey()
+
+def pytest_addoption(parser):
+    group = parser.getgroup('html5validate')
+    group.addoption('--html5validate-no-cache', action='store_true',
+                    help="don't share validation results through the pytest cache dir")
+    group.addoption('--html5validate-slowest', type=int, default=5,
+                    help='number of slowest validated documents to report (default: 5)')
+
+def pytest_configure(config):
+    cache_dir = None
+    if config.cache is not None and not config.getoption('html5validate_no_cache'):
+        # only made once something is validated, not in every project's cache.
+        cache_dir = lambda: str(config.cache.mkdir('html5validate'))
+    config.stash[engine_key] = ValidationEngine(cache_dir)
+
+@pytest.fixture(name='html5validate', scope='session')
+def html5validate_fixture(pytestconfig):
+    """
+        Validate some HTML5, raising if it isn't valid:
+
+            def test_index(client, html5validate):
+                html5validate(client.get('/').content.decode())
+    """
+    return pytestconfig.stash[engine_key]
+
+def pytest_sessionfinish(session):
+    # pytest-xdist workers hand their timings back to the controller.
+    workeroutput = getattr(session.config, 'workeroutput', None)
+    if workeroutput is not None:
+        engine = session.config.stash[engine_key]
+        workeroutput['html5validate'] = {'timings': engine.timings, 'hits': engine.hits}
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_testnodedown(node, error):
+    output = getattr(node, 'workeroutput', {}).get('html5validate')
+    if output:
+        engine = node.config.stash[engine_key]
+        engine.timings.extend(tuple(t) for t in output['timings'])
+        engine.hits += output['hits']
+
+def pytest_terminal_summary(terminalreporter, config):
+    engine = config.stash[engine_key]
+    if not (engine.timings or engine.hits):
+        return
+
+    terminalreporter.write_sep('=', 'html5validate')
+    terminalreporter.write_line(
+        f'{len(engine.timings)} documents validated in '
+        f'{sum(t for t, _ in engine.timings):.3f}s, {engine.hits} from cache')
+
+    slowest = sorted(engine.timings, reverse=True)[:config.getoption('html5validate_slowest')]
+    for seconds, name in slowest:
+        terminalreporter.write_line(f'{seconds:8.3f}s {name}')
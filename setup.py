@@ -4,7 +4,7 @@ __version__ = '0.0.3'
 
 setup(
     name='html5validate',
-    py_modules=['html5validate'],
+    py_modules=['html5validate', 'pytest_html5validate'],
     version=__version__,
     description='Pure Python Basic HTML validatation library - for CI, django tests, etc.  Based on HTML5lib',
     long_description=open('README.rst', 'r').read(),
@@ -16,10 +16,12 @@ setup(
     keywords = ['html5', 'validation', 'web', 'lint'],
     test_suite='tests',
     install_requires=["html5lib"],
+    entry_points={'pytest11': ['html5validate = pytest_html5validate']},
     classifiers=['Development Status :: 4 - Beta',
                  'Intended Audience :: Developers',
                  'License :: OSI Approved :: MIT License',
                  'Topic :: Software Development :: Libraries :: Python Modules',
+                 'Framework :: Pytest',
                  'Programming Language :: Python',
                  ],
         )
@@ -2,6 +2,10 @@
     Initial tests for html5validate library.
 """
 
+import io
+import json
+import tempfile
+import time
 import unittest
 
 from glob import glob
@@ -10,6 +14,11 @@ from os.path import dirname, join as pathjoin
 import html5validate
 from html5validate import validate, EmptyPage, ParseError, HTML5Invalid
 
+try:
+    from pytest_html5validate import ValidationEngine
+except ImportError: # pytest not installed
+    ValidationEngine = None
+
 def findfiles(test_type):
     return glob(pathjoin(dirname(__file__),'htmlfiles', test_type, '*.html'))
 
@@ -101,3 +110,277 @@ class TestFromFiles(unittest.TestCase):
                         validate(html.read())
 
 
+class TestQuick(unittest.TestCase):
+    def test_empty(self):
+        with self.assertRaises(EmptyPage):
+            validate('  ', quick=True)
+
+    def test_no_doctype(self):
+        with self.assertRaises(ParseError):
+            html5validate.prescan('<html><body><p>hi</p></body></html>')
+
+    def test_comment_before_doctype(self):
+        html5validate.prescan('<!-- hi --><!doctype html><html></html>')
+
+    def test_invalid_tag(self):
+        with self.assertRaises(html5validate.InvalidTag):
+            html5validate.prescan('<!doctype html><body><funny>joke</funny></body>')
+
+    def test_invalid_attr(self):
+        with self.assertRaises(html5validate.InvalidAttribute):
+            html5validate.prescan('<!doctype html><body><a hrf="/">hi</a></body>')
+
+    def test_ignores_raw_text(self):
+        html5validate.prescan('''<!doctype html><html><head>
+            <script>if (a<b && c> d) { x = "<funny hrf=1>"; }</script>
+            <!-- <funny> -->
+            </head><body><p title="a > <funny>">hi</p></body></html>''')
+
+    def test_raw_text_near_miss_end_tag(self):
+        text = '''<!doctype html><html><body>
+            <script>var s = "</scripty>";</script>
+            <style>/* </styles> */</style></body></html>'''
+        html5validate.prescan(text)
+        validate(text, quick=True)
+
+    def test_unterminated_is_linear(self):
+        for broken in ('x<y ', '<a "x ', '<!-- ', '<!--<p>'):
+            text = '<!doctype html><html><body><p>' + broken * 20000
+            with self.subTest(broken=broken):
+                start = time.perf_counter()
+                html5validate.prescan(text)
+                self.assertLess(time.perf_counter() - start, 1.0)
+        start = time.perf_counter()
+        with self.assertRaises(ParseError):
+            html5validate.prescan('<!-- a -->' * 20000 + '<p>')
+        self.assertLess(time.perf_counter() - start, 1.0)
+
+    def test_ignores_foreign_content(self):
+        html5validate.prescan('''<!doctype html><html><body>
+            <svg viewBox="0 0 10 10"><svg><circle cx="1"/></svg><rect x="0"/></svg>
+            <p>hi</p></body></html>''')
+        with self.assertRaises(html5validate.InvalidTag):
+            html5validate.prescan('''<!doctype html><html><body>
+                <svg><circle cx="1"/></svg><funny>joke</funny></body></html>''')
+
+    def test_valid_files_pass(self):
+        for filename in findfiles('valid'):
+            with open(filename) as html:
+                with self.subTest(f=filename):
+                    validate(html.read(), quick=True)
+
+    def test_invalid_files_fail(self):
+        for test_type, exception in (
+                ('invalid', html5validate.ValidationException),
+                ('invalid_attributes', html5validate.InvalidAttribute)):
+            for filename in findfiles(test_type):
+                with open(filename) as html:
+                    with self.subTest(f=filename):
+                        with self.assertRaises(exception):
+                            validate(html.read(), quick=True)
+
+class TestStream(unittest.TestCase):
+    VALID = '<!doctype html><html><body><h1>hi</h1></body></html>'
+    INVALID = '<!doctype html><html><body><funny>joke</funny></body></html>'
+
+    def run_stream(self, data, framing):
+        out = io.StringIO()
+        failures = html5validate.validate_stream(io.BytesIO(data), out, framing)
+        return failures, [json.loads(line) for line in out.getvalue().splitlines()]
+
+    def test_jsonl(self):
+        data = (json.dumps(self.VALID) + '\n'
+                + json.dumps({'id': 'page2', 'html': self.INVALID}) + '\n').encode()
+        failures, results = self.run_stream(data, 'jsonl')
+        self.assertEqual(failures, 1)
+        self.assertEqual(results[0], {'id': 0, 'valid': True})
+        self.assertEqual(results[1]['id'], 'page2')
+        self.assertEqual(results[1]['error'], 'InvalidTag')
+
+    def test_nul(self):
+        data = '\0'.join((self.VALID, self.INVALID, self.VALID)).encode()
+        failures, results = self.run_stream(data, 'nul')
+        self.assertEqual([r['valid'] for r in results], [True, False, True])
+
+    def test_nul_across_chunks(self):
+        docs = [self.VALID * 1000, self.INVALID]
+        data = '\0'.join(docs).encode()
+        self.assertEqual(
+            [text for _, text in html5validate.read_stream(io.BytesIO(data), 'nul')],
+            docs)
+
+    def test_length(self):
+        data = b''.join(b'%d\n%s' % (len(doc), doc) for doc in
+                        (self.INVALID.encode(), self.VALID.encode()))
+        failures, results = self.run_stream(data, 'length')
+        self.assertEqual([r['valid'] for r in results], [False, True])
+
+    def test_jsonl_bad_frames(self):
+        data = b'"%s"\n{bad json\n{"id": "x"}\n42\n"%s"\n' % (
+            self.VALID.encode(), self.VALID.encode())
+        failures, results = self.run_stream(data, 'jsonl')
+        self.assertEqual(failures, 3)
+        self.assertEqual([r['valid'] for r in results], [True, False, False, False, True])
+        self.assertEqual([r['id'] for r in results], [0, 1, 'x', 3, 4])
+        self.assertEqual({r.get('error') for r in results[1:4]}, {'FramingError'})
+
+    def test_nul_many_chunks(self):
+        docs = ['a' * (html5validate.STREAM_CHUNK_SIZE * 3 + 7), '', 'b', 'c' * 10]
+        data = ('\0'.join(docs) + '\0').encode()
+        self.assertEqual(
+            [text for _, text in html5validate.read_stream(io.BytesIO(data), 'nul')],
+            docs)
+
+    def test_length_bad_header(self):
+        for header in (b'twelve', b'-1', b'+5', b'1_0', b' 5'):
+            with self.subTest(header=header):
+                with self.assertRaises(html5validate.FramingError):
+                    list(html5validate.read_stream(
+                        io.BytesIO(header + b'\n<doc>\n5\nhello'), 'length'))
+
+    def test_length_truncated(self):
+        with self.assertRaises(html5validate.FramingError):
+            list(html5validate.read_stream(io.BytesIO(b'100\n<!doctype'), 'length'))
+
+class TestRules(unittest.TestCase):
+    def test_structure_only(self):
+        validate('<!doctype html><html><body><a hrf="/">hi</a></body></html>',
+                 rules=('structure',))
+        with self.assertRaises(html5validate.MisplacedElement):
+            validate('<!doctype html><html><body><li>hi</li></body></html>',
+                     rules=('structure',))
+
+    def test_attributes_only(self):
+        validate('<!doctype html><html><body><li>hi</li></body></html>',
+                 rules=('attributes',))
+        with self.assertRaises(html5validate.InvalidAttribute):
+            validate('<!doctype html><html><body><a hrf="/">hi</a></body></html>',
+                     rules=('attributes',))
+
+    def test_other_rule_needing_attributes(self):
+        seen = []
+
+        class AriaValidator(html5validate.Validator):
+            rule_events = dict(html5validate.Validator.rule_events,
+                               aria=frozenset(('startTag', 'attributes')))
+
+            def startTag(self, name, attributes):
+                seen.append((name, dict(attributes.items())))
+                return super().startTag(name, attributes)
+
+        dom = html5validate.PARSER.parse(
+            '<!doctype html><html><body><a hrf="/">hi</a></body></html>')
+        AriaValidator(dom, rules=('structure', 'aria'))()
+        self.assertIn(('a', {'hrf': '/'}), seen)
+        with self.assertRaises(html5validate.InvalidAttribute):
+            AriaValidator(dom)()
+
+    def test_events_not_needed(self):
+        seen = []
+
+        class RecordingValidator(html5validate.Validator):
+            def startTag(self, name, attributes):
+                seen.append((name, dict(attributes.items())))
+                return super().startTag(name, attributes)
+
+        dom = html5validate.PARSER.parse(
+            '<!doctype html><html><body><a href="/">hi</a></body></html>')
+        RecordingValidator(dom, rules=())()
+        self.assertEqual(seen, [])
+        RecordingValidator(dom, rules=('structure',))()
+        self.assertIn(('a', {}), seen)
+
+    def test_rules_string(self):
+        with self.assertRaises(TypeError):
+            validate('<!doctype html><html></html>', rules='structure')
+
+    def test_unknown_rule(self):
+        with self.assertRaises(ValueError):
+            validate('<!doctype html><html></html>', rules=('spelling',))
+
+    def test_skips_unneeded_events(self):
+        seen = []
+
+        class TextValidator(html5validate.Validator):
+            def text(self, data):
+                seen.append(data)
+
+        dom = html5validate.PARSER.parse('<!doctype html><html><body>hi</body></html>')
+        TextValidator(dom)()
+        self.assertEqual(seen, [])
+
+        TextValidator.rule_events = dict(html5validate.Validator.rule_events,
+                                         words=frozenset(('text',)))
+        TextValidator(dom)()
+        self.assertEqual(seen, ['hi'])
+
+@unittest.skipIf(ValidationEngine is None, "needs pytest")
+class TestValidationEngine(unittest.TestCase):
+    VALID = '<!doctype html><html><body><h1>hi</h1></body></html>'
+    INVALID = '<!doctype html><html><body><funny>joke</funny></body></html>'
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.engine = ValidationEngine(self.tmpdir.name)
+
+    def test_caches_valid(self):
+        self.engine(self.VALID)
+        self.engine(self.VALID)
+        self.assertEqual(len(self.engine.timings), 1)
+        self.assertEqual(self.engine.hits, 1)
+
+    def test_caches_invalid(self):
+        for _ in range(2):
+            with self.assertRaises(html5validate.InvalidTag):
+                self.engine(self.INVALID)
+        self.assertEqual(self.engine.hits, 1)
+
+    def test_shared_between_engines(self):
+        self.engine(self.VALID, name='index')
+        other = ValidationEngine(self.tmpdir.name)
+        other(self.VALID)
+        self.assertEqual((len(other.timings), other.hits), (0, 1))
+        self.assertEqual(self.engine.timings[0][1], 'index')
+
+    def test_warnings_on_cache_hit(self):
+        text = '<!doctype html><html><body><a data-x="1">hi</a></body></html>'
+        for _ in range(2):
+            with self.assertWarns(UserWarning):
+                self.engine(text)
+        self.assertEqual(self.engine.hits, 1)
+
+    def test_lazy_cache_dir(self):
+        made = []
+
+        def make():
+            made.append(self.tmpdir.name)
+            return self.tmpdir.name
+
+        engine = ValidationEngine(make)
+        self.assertEqual(made, [])
+        engine(self.VALID)
+        engine(self.VALID)
+        self.assertEqual((made, engine.hits), ([self.tmpdir.name], 1))
+
+    def test_html5lib_in_key(self):
+        import html5lib
+        key = self.engine.key(self.VALID, False, None)
+        original = html5lib.__version__
+        html5lib.__version__ = 'changed'
+        self.addCleanup(setattr, html5lib, '__version__', original)
+        self.assertNotEqual(self.engine.key(self.VALID, False, None), key)
+
+    def test_library_in_key(self):
+        import pytest_html5validate
+        key = self.engine.key(self.VALID, False, None)
+        original = pytest_html5validate.LIBRARY_HASH
+        pytest_html5validate.LIBRARY_HASH = 'changed'
+        self.addCleanup(setattr, pytest_html5validate, 'LIBRARY_HASH', original)
+        self.assertNotEqual(self.engine.key(self.VALID, False, None), key)
+
+    def test_options_in_key(self):
+        self.engine(self.VALID)
+        self.engine(self.VALID, rules=('structure',))
+        self.assertEqual(len(self.engine.timings), 2)
+
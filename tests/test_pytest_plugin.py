@@ -0,0 +1,104 @@
+"""
+    Tests for the pytest plugin, run through pytest's own pytester.
+"""
+
+import re
+import unittest
+
+try:
+    import pytest
+except ImportError:
+    raise unittest.SkipTest("needs pytest")
+
+try:
+    from importlib.metadata import entry_points
+except ImportError: # python < 3.8
+    entry_points = None
+
+from pytest_html5validate import engine_key, pytest_sessionfinish, pytest_testnodedown
+
+pytest_plugins = ['pytester']
+
+INSTALLED = entry_points is not None and any(
+    ep.value == 'pytest_html5validate' for ep in entry_points(group='pytest11'))
+
+TESTS = '''
+import pytest
+import html5validate as h
+
+PAGE = '<!doctype html><html><body><h1>hi</h1></body></html>'
+
+@pytest.mark.parametrize('i', range(3))
+def test_valid(html5validate, i):
+    html5validate(PAGE, name='index')
+
+def test_invalid(html5validate):
+    with pytest.raises(h.InvalidTag):
+        html5validate('<!doctype html><html><body><funny></funny></body></html>', name='funny')
+
+def test_warns(html5validate):
+    with pytest.warns(UserWarning):
+        html5validate('<!doctype html><html><body><a data-x="1">hi</a></body></html>')
+'''
+
+def run(pytester, *args):
+    # via the pytest11 entry point if installed, otherwise by hand.
+    if not INSTALLED:
+        args = ('-p', 'pytest_html5validate') + args
+    return pytester.runpytest(*args)
+
+def test_fixture_and_summary(pytester):
+    pytester.makepyfile(TESTS)
+    result = run(pytester)
+    result.assert_outcomes(passed=5)
+    result.stdout.fnmatch_lines([
+        '*= html5validate =*',
+        '3 documents validated in *s, 2 from cache',
+        '*s index',
+        '*s funny',
+    ])
+
+def test_cache_between_runs(pytester):
+    pytester.makepyfile(TESTS)
+    run(pytester).assert_outcomes(passed=5)
+    result = run(pytester)
+    result.assert_outcomes(passed=5)
+    result.stdout.fnmatch_lines(['0 documents validated in *s, 5 from cache'])
+
+def test_no_cache(pytester):
+    pytester.makepyfile(TESTS)
+    run(pytester, '--html5validate-no-cache').assert_outcomes(passed=5)
+    result = run(pytester, '--html5validate-no-cache')
+    result.assert_outcomes(passed=5)
+    result.stdout.fnmatch_lines(['5 documents validated in *s, 0 from cache'])
+
+def test_slowest(pytester):
+    pytester.makepyfile(TESTS)
+    result = run(pytester, '--html5validate-no-cache', '--html5validate-slowest=1')
+    timings = [line for line in result.stdout.lines
+               if re.match(r'\s*\d+\.\d{3}s \S+$', line)]
+    assert len(timings) == 1
+
+def test_nothing_without_validation(pytester):
+    pytester.makepyfile('def test_nothing(): pass')
+    result = run(pytester)
+    result.assert_outcomes(passed=1)
+    assert ' html5validate ' not in result.stdout.str()
+    assert not (pytester.path / '.pytest_cache' / 'd' / 'html5validate').exists()
+
+def test_xdist_merge(pytester):
+    args = () if INSTALLED else ('-p', 'pytest_html5validate')
+    worker = pytester.parseconfigure(*args)
+    controller = pytester.parseconfigure(*args)
+
+    worker.stash[engine_key].timings.append((0.5, 'page'))
+    worker.stash[engine_key].hits = 3
+    worker.workeroutput = {}
+    pytest_sessionfinish(type('Session', (), {'config': worker}))
+
+    node = type('Node', (), {'config': controller, 'workeroutput': worker.workeroutput})
+    pytest_testnodedown(node, None)
+
+    engine = controller.stash[engine_key]
+    assert engine.timings == [(0.5, 'page')]
+    assert engine.hits == 3